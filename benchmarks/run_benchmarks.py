@@ -0,0 +1,361 @@
+"""
+Performance benchmarks for the hot paths of aidefender, run offline on CPU over the bundled artifacts.
+
+Record a baseline on the reference machine:
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Compare the current tree against the recorded baseline (exits with 1 on a regression):
+    python benchmarks/run_benchmarks.py
+
+Timings are only comparable on the machine the baseline was recorded on, so the comparison
+refuses to run when the baseline is missing or comes from a different machine. Dependency
+versions are stored with the baseline and their differences are printed with the report.
+Saving a baseline for a subset of --benchmarks only replaces the entries of that subset.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from functools import lru_cache
+
+import pkg_resources
+
+import numpy as np
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATS_AND_DOGS_DATA_PATH = os.path.join(ROOT_PATH, 'artifacts/data/cats_dogs_small/')
+CUSTOMVISION_CATS_AND_DOGS_TF_MODEL_PATH = os.path.join(ROOT_PATH, 'artifacts/models/customvision_cats_and_dogs_tf/')
+MLFLOW_CATS_AND_DOGS_PYTORCH_MODEL_PATH = os.path.join(ROOT_PATH, 'artifacts/models/mlflow_cats_and_dogs_pytorch/')
+MLFLOW_CATS_AND_DOGS_TF_MODEL_PATH = os.path.join(ROOT_PATH, 'artifacts/models/mlflow_cats_and_dogs_customvision_tf/')
+
+BASELINE_PATH = os.path.join(ROOT_PATH, 'benchmarks/baseline.json')
+
+LABELS = ['cat', 'dog']
+TARGET_SIZE = 224
+PREDICT_BATCH_SIZES = [1, 8, 32]
+SEED = 42
+
+# distributions, which versions affect the timings and are stored with the results
+DEPENDENCIES = [
+    'numpy', 'torch', 'torchvision', 'tensorflow', 'tensorflow-gpu', 'adversarial-robustness-toolbox', 'mlflow',
+    'Pillow', 'opencv-python',
+]
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark setup function. The setup function does all the preparation work
+    and returns a callable without arguments, which is the part being timed.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def _load_images():
+    from aidefender.utils.data import load_image_dataset
+
+    images, _ = load_image_dataset(CATS_AND_DOGS_DATA_PATH, LABELS, TARGET_SIZE, 'jpg')
+
+    return images
+
+
+@lru_cache(maxsize=None)
+def _load_art_model(model_path):
+    import mlflow
+    from aidefender.utils.mlflow import create_art_model
+
+    return create_art_model(mlflow.pyfunc.load_model(model_path))
+
+
+@benchmark('load_image_dataset')
+def _setup_load_image_dataset():
+    from aidefender.utils.data import load_image_dataset
+
+    return lambda: load_image_dataset(CATS_AND_DOGS_DATA_PATH, LABELS, TARGET_SIZE, 'jpg')
+
+
+@benchmark('resize_and_crop_image')
+def _setup_resize_and_crop_image():
+    from PIL import Image
+    from aidefender.utils.image import resize_and_crop_image
+
+    images = []
+    for image_file in ['cat/cat.2150.jpg', 'cat/cat.11826.jpg']:  # a wide and a tall image
+        with Image.open(os.path.join(CATS_AND_DOGS_DATA_PATH, image_file)) as image:
+            images.append(image.copy())
+
+    return lambda: [resize_and_crop_image(image, TARGET_SIZE) for image in images]
+
+
+@benchmark('create_art_model_pytorch')
+def _setup_create_art_model_pytorch():
+    import mlflow
+    from aidefender.utils.mlflow import create_art_model
+
+    return lambda: create_art_model(mlflow.pyfunc.load_model(MLFLOW_CATS_AND_DOGS_PYTORCH_MODEL_PATH))
+
+
+@benchmark('create_art_model_tf')
+def _setup_create_art_model_tf():
+    import mlflow
+    from aidefender.utils.mlflow import create_art_model
+
+    return lambda: create_art_model(mlflow.pyfunc.load_model(MLFLOW_CATS_AND_DOGS_TF_MODEL_PATH))
+
+
+@benchmark('customvision_tf_predict')
+def _setup_customvision_tf_predict():
+    from aidefender.models import CustomVisionTensorFlowModel
+
+    model = CustomVisionTensorFlowModel(CUSTOMVISION_CATS_AND_DOGS_TF_MODEL_PATH)
+    images = _load_images()
+
+    return lambda: model.predict(images)
+
+
+def _register_pytorch_predict(batch_size):
+    @benchmark(f'pytorch_predict_bs{batch_size}')
+    def _setup_pytorch_predict():
+        import mlflow.pytorch
+        from aidefender.utils.pytorch import predict
+
+        model = mlflow.pytorch.load_model(MLFLOW_CATS_AND_DOGS_PYTORCH_MODEL_PATH)
+        model.eval()
+        images = _load_images()
+
+        return lambda: predict(model, images, batch_size=batch_size, normalize=True)
+
+    @benchmark(f'art_pytorch_predict_bs{batch_size}')
+    def _setup_art_pytorch_predict():
+        art_model = _load_art_model(MLFLOW_CATS_AND_DOGS_PYTORCH_MODEL_PATH)
+        images = _load_images()
+
+        return lambda: art_model.predict(images, batch_size=batch_size)
+
+
+for _batch_size in PREDICT_BATCH_SIZES:
+    _register_pytorch_predict(_batch_size)
+
+
+@benchmark('bart_preprocessing')
+def _setup_bart_preprocessing():
+    from aidefender.defences.bart import BaRT
+
+    bart = BaRT()
+    # BaRT is used on images scaled to [0, 1], as in notebooks/test_bart_defense.ipynb
+    images = _load_images().astype(np.float32) / 255.0
+
+    return lambda: bart(images, y=None)
+
+
+@benchmark('robustness_accuracy_fgsm')
+def _setup_robustness_accuracy_fgsm():
+    from aidefender.robustness import robustness_accuracy
+
+    art_model = _load_art_model(MLFLOW_CATS_AND_DOGS_PYTORCH_MODEL_PATH)
+    images = _load_images()
+
+    return lambda: robustness_accuracy(art_model, images, attack_name='fgsm')
+
+
+def _seed():
+    # randomized code, e.g. the transforms chosen by BaRT, has to do the same work in every run
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+def run_benchmark(name, nb_repeats):
+    """
+    Runs the benchmark once to warm up and then `nb_repeats` times, returning the timings in seconds.
+    """
+    func = BENCHMARKS[name]()
+    _seed()
+    func()
+
+    timings = []
+    for _ in range(nb_repeats):
+        _seed()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'min': float(np.min(timings)),
+        'median': float(np.median(timings)),
+        'nb_repeats': nb_repeats,
+    }
+
+
+def _get_version(distribution):
+    try:
+        return pkg_resources.get_distribution(distribution).version
+    except pkg_resources.DistributionNotFound:
+        return None
+
+
+def get_machine_meta():
+    """
+    Returns the description of the current machine and dependency versions, which is stored with the results.
+    """
+    versions = {'python': platform.python_version()}
+    versions.update({distribution: _get_version(distribution) for distribution in DEPENDENCIES})
+
+    return {
+        'os': platform.system(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def get_machine_mismatches(meta, baseline_meta):
+    """
+    Returns the machine properties, which timings are not comparable across, that differ from the baseline.
+    """
+    return [
+        f'{key}: baseline {baseline_meta.get(key)!r}, current {meta[key]!r}'
+        for key in ['os', 'machine', 'processor', 'cpu_count']
+        if baseline_meta.get(key) != meta[key]
+    ]
+
+
+def get_version_differences(meta, baseline_meta):
+    """
+    Returns the dependency versions that differ from the baseline.
+    """
+    baseline_versions = baseline_meta.get('versions', {})
+
+    return [
+        f'{name}: baseline {baseline_versions.get(name)}, current {version}'
+        for name, version in meta['versions'].items()
+        if baseline_versions.get(name) != version
+    ]
+
+
+def compare(results, baseline_results, tolerance):
+    """
+    Prints the comparison report and returns the names of the benchmarks, which median time
+    regressed by more than `tolerance` relative to the baseline.
+    """
+    regressions = []
+
+    print(f'{"benchmark":<32}{"baseline, s":>14}{"current, s":>14}{"ratio":>10}')
+    for name, result in results.items():
+        baseline = baseline_results.get(name)
+        if baseline is None:
+            print(f'{name:<32}{"-":>14}{result["median"]:>14.4f}{"-":>10}')
+            continue
+
+        ratio = result['median'] / baseline['median']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+
+        print(f'{name:<32}{baseline["median"]:>14.4f}{result["median"]:>14.4f}{ratio:>10.2f}{flag}')
+
+    return regressions
+
+
+def _positive_int(value):
+    value = int(value)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the aidefender performance benchmarks.')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Benchmarks to run, all by default')
+    parser.add_argument('--nb-repeats', type=_positive_int, default=5, help='Number of timed runs per benchmark')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Path to the baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown of the median time before reporting a regression')
+    parser.add_argument('--output', default=None, help='Optional path to save the results JSON')
+    parser.add_argument('--ignore-machine-mismatch', action='store_true',
+                        help='Compare against a baseline recorded on a different machine, only warning about it')
+    args = parser.parse_args()
+
+    meta = get_machine_meta()
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        parser.error(f'baseline file {args.baseline} does not exist, record one with --save-baseline')
+
+    if args.save_baseline:
+        # a partial run only replaces its own entries, which must then come from the same machine and dependencies
+        is_partial = set(args.benchmarks) != set(BENCHMARKS)
+        if baseline is not None and is_partial:
+            differences = get_machine_mismatches(meta, baseline['meta']) + get_version_differences(meta, baseline['meta'])
+            if differences:
+                parser.error(
+                    'cannot update part of a baseline recorded on a different machine or with different dependencies: '
+                    + '; '.join(differences) + ' (rerun all benchmarks to record a new baseline)'
+                )
+    else:
+        mismatches = get_machine_mismatches(meta, baseline['meta'])
+        if mismatches:
+            message = 'the baseline was recorded on a different machine, timings are not comparable: ' + '; '.join(mismatches)
+            if not args.ignore_machine_mismatch:
+                parser.error(f'{message} (use --ignore-machine-mismatch to compare anyway)')
+            print(f'Warning: {message}')
+
+    # benchmarks must be comparable across machines with and without GPUs
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+    results = {}
+    for name in args.benchmarks:
+        print(f'Running {name}...', flush=True)
+        results[name] = run_benchmark(name, args.nb_repeats)
+
+    report = {
+        'meta': meta,
+        'results': results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        if baseline is not None and is_partial:
+            baseline['meta'] = meta
+            baseline['results'].update(results)
+            report = baseline
+
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f'Saved baseline: {args.baseline}')
+        return 0
+
+    version_differences = get_version_differences(meta, baseline['meta'])
+    if version_differences:
+        print('Dependency versions differ from the baseline, slowdowns may come from them: ' + '; '.join(version_differences))
+
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print(f'Regressions: {", ".join(regressions)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+# %%
+import os
+import numpy as np
+
+from aidefender.exp.datasets import create_dataset
+# %%
+dataset_class = 'aidefender.exp.datasets.RP2KDataset'
+data_path = '/datadrive/aidefender/data/RP2K_categories/reformatted/'
+
+# uncompressed .npy files can be opened with np.load(..., mmap_mode='r'),
+# so readers page in only the batches they touch and share the page cache
+images_output_path = os.path.join(data_path, 'images.npy')
+labels_output_path = os.path.join(data_path, 'labels.npy')
+# %%
+dataset = create_dataset(dataset_class, data_path)
+# %%
+print(f'Images: {dataset.images.shape}')
+print(f'Labels: {dataset.labels.shape}')
+# %%
+# create_dataset has already loaded the images into memory, so this saves the array as is
+np.save(images_output_path, dataset.images)
+np.save(labels_output_path, dataset.labels)
+print(f'Saved: {images_output_path}, {labels_output_path}')
+# %%
+images = np.load(images_output_path, mmap_mode='r')
+labels = np.load(labels_output_path, mmap_mode='r')
+print(f'Memory-mapped images: {images.shape}, labels: {labels.shape}')
+# %%
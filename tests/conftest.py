@@ -1,6 +1,4 @@
 import pytest
-from azureml.core import Workspace
-from azureml.core.authentication import AzureCliAuthentication, AuthenticationException
 
 CATS_AND_DOGS_DATA_PATH = "artifacts/data/cats_dogs_small/"
 CUSTOMVISION_CATS_AND_DOGS_TF_MODEL_PATH = "artifacts/models/customvision_cats_and_dogs_tf/"
@@ -33,6 +31,11 @@ def mlflow_cats_and_dogs_tf_model_path():
 
 @pytest.fixture(scope="module")
 def aml_workspace():
+    # azureml is imported here rather than at module level so that collecting
+    # tests which do not need a workspace does not pull in the whole SDK
+    from azureml.core import Workspace
+    from azureml.core.authentication import AzureCliAuthentication, AuthenticationException
+
     try:
         ws = Workspace(
             subscription_id="9e7c2d63-bc69-4abc-a8c4-7b90cf90b7de",